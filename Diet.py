@@ -1,10 +1,44 @@
 import datetime
 import re
-import requests
 import json
 import base64
+from collections import namedtuple
+from functools import cached_property
 
 from Post import Post
+from utils.date_util import get_last_monday
+from constants.cafeteria import cafeteria_full_name_list
+from utils.http_util import create_session
+
+# 식당명, 9/11~9/17 형식, 9.18~9.24 형식을 한번의 스캔으로 찾는다.
+_TITLE_RE = re.compile(
+    f"(?P<loc>{'|'.join(cafeteria_full_name_list)})"
+    r'|(?P<week>\d{1,2}/\d{1,2}(?:~\d{1,2}(?:/\d{1,2})?)?)'
+    r'|(?P<dot>\d+\.\d+~\d+\.\d+)'
+)
+
+TitleFields = namedtuple('TitleFields', 'location start_spec dot_spec')
+
+BASE64_IMAGE_PREFIXES = ('data:image/png;base64', 'data:image/jpeg;base64')
+
+_SESSION = create_session()
+
+
+def get_next_monday_year() -> int:
+    today = datetime.date.today()
+    days_unitl_next_monday = (0 - today.weekday() + 7) % 7
+    next_monday = today + datetime.timedelta(days=days_unitl_next_monday)
+    return next_monday.year
+
+# 크롤러 한번 실행되는 동안에는 바뀌지 않으므로 import 시점에 한번만 계산한다.
+_NEXT_MONDAY_YEAR = get_next_monday_year()
+
+
+def classify(title: str) -> TitleFields:
+    found = {}
+    for match in _TITLE_RE.finditer(title):
+        found.setdefault(match.lastgroup, match.group())
+    return TitleFields(found.get('loc'), found.get('week'), found.get('dot'))
 
 
 class Diet:
@@ -17,62 +51,38 @@ class Diet:
         self.post_url = "http://130.162.153.197:8000/diet/upload"
         self.yymmdd = self.start_date.strftime('%y%m%d')
 
-    @property
+    @cached_property
+    def title_fields(self) -> TitleFields:
+        return classify(self.title)
+
+    @cached_property
     def start_date(self) -> datetime.datetime | None:
+        start_spec = self.title_fields.start_spec
+        if start_spec:  # (9/11 ~ 9/17) pattern found
+            month, day = start_spec.split('~')[0].split('/')
+            return get_last_monday(datetime.date(_NEXT_MONDAY_YEAR, int(month), int(day)))
 
-        def get_last_monday(dt: datetime.datetime) -> datetime.datetime:
-            """
-            Returns the datetime of the given date if it's a Monday, 
-            otherwise returns the datetime of the previous Monday.
-            """
-            while dt.weekday() != 0:  # 0 represents Monday in the weekday system
-                dt -= datetime.timedelta(days=1)
-            return dt
-
-
-        def get_next_monday_year() -> str:
-            today = datetime.datetime.now()
-            days_unitl_next_monday = (0 - today.weekday() + 7) % 7
-            next_monday = today + \
-                datetime.timedelta(days=days_unitl_next_monday)
-            next_monday_year = next_monday.year
-            return next_monday_year
-
-        pattern = r'(\d{1,2}/\d{1,2}(?:~\d{1,2}(?:/\d{1,2})?)?)'
-        result = re.findall(pattern, self.title)
-        if result:  # (9/11 ~ 9/17) pattern found
-            date_string = result[0].split('~')[0]
-            next_monday_year = get_next_monday_year()
-            extracted_date = datetime.datetime.strptime(f'{next_monday_year}/{date_string}', '%Y/%m/%d').date()
-            return get_last_monday(extracted_date)
-
-        pattern = r"(\d+\.\d+~\d+\.\d+)" # pattern for 9.18~9.24
-        result = re.findall(pattern, self.title)
+        dot_spec = self.title_fields.dot_spec
         # 코드가 지저분하고 로직관리가 한곳에서 되지 않으니, 내가 쓴 코드를 내가 착각해서 버그를 못고침.
         # 분리하고, 책임을 나눠야한다.
         # 결국 return 은 한곳에서하고, get_last_monday도 스태틱메서드처럼 한곳에서 호출해야함.
-        if result:
-            date_string = result[0].split('~')[0]
-            next_monday_year = get_next_monday_year()
-            return get_last_monday(datetime.datetime.strptime(f'{next_monday_year}.{date_string}', '%Y.%m.%d').date())
+        if dot_spec:
+            month, day = dot_spec.split('~')[0].split('.')
+            return get_last_monday(datetime.date(_NEXT_MONDAY_YEAR, int(month), int(day)))
         return self.post.target_date
 
     @property
     def location(self):
-        candidates = ['본사', '노포', '신평', '호포', '광안', '대저', '경전철', '안평']
-        for elem in candidates:
-            if elem in self.title:
-                return elem
-        return None
+        return self.title_fields.location
 
     def upload_image_to_server(self):
         if self.image_url is None:
             raise TypeError('image_url should not None')
         
-        if 'data:image/png;base64' in self.image_url:
+        if self.image_url.startswith(BASE64_IMAGE_PREFIXES):
             image_content = base64.b64decode(self.image_url.split(',')[1].strip()) 
         else:
-            response = requests.get(self.image_url)
+            response = _SESSION.get(self.image_url, timeout=10)
         #ToDo url이 아니라 base64 인코딩된 이미지 자체가 입력으로 들어온 경우 처리하기
             if response.status_code != 200:
                 print("Failed to retrieve the file.")
@@ -90,7 +100,7 @@ class Diet:
             "upload_file": ('upload_file.jpg', image_content, 'image/jpeg'),
         }
 
-        post_response = requests.post(self.post_url, data=data, files=files)
+        post_response = _SESSION.post(self.post_url, data=data, files=files, timeout=30)
         print(f'Uploading : {self.post_title}')
 
         print('Upload result : ', json.loads(post_response.content))
@@ -1,72 +1,142 @@
 import base64
+import datetime
+import io
 import os
 import json
-import requests
-import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options
-from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
+
+from Post import Post
+from Diet import Diet, BASE64_IMAGE_PREFIXES
+from utils.http_util import create_session
 
 load_dotenv()
 
 btcep_id = os.getenv('BTCEP_ID')
 btcep_pw = os.getenv('BTCEP_PW')
+btcep_profile_dir = os.getenv('BTCEP_PROFILE_DIR')
+
+# 게시판의 모든 글 정보를 한번의 스크립트 호출로 가져온다.
+POST_ROWS_SCRIPT = """
+return Array.from(document.querySelectorAll('form#boardList tbody tr'))
+    .filter(row => row.querySelector('td.L a'))
+    .map(row => {
+        const link = row.querySelector('td.L a');
+        const cells = row.querySelectorAll('td.C');
+        return {
+            id: link.id,
+            title: link.textContent.trim(),
+            created_at: cells[cells.length - 2].textContent.trim(),
+        };
+    });
+"""
+
+IMAGE_SRC_SCRIPT = "var img = document.querySelector('img'); return img ? img.src : null;"
+
+
+def wait_for_board_rows(wait):
+    # form#boardList는 글 목록보다 먼저 생기므로 행이 그려질 때까지 기다린다.
+    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'form#boardList tbody tr')))
+
+
+def diet_image_loaded(d):
+    # 글을 연 직후에는 icon_new 이미지가 먼저 잡히므로 실제 식단 이미지가 나올 때까지 기다린다.
+    # find_element + get_attribute 두번의 왕복 대신 스크립트 한번으로 src를 읽는다.
+    src = d.execute_script(IMAGE_SRC_SCRIPT)
+    return src if src and 'icon_new' not in src else False
 
 
 class DietCrawler:
-    def __init__(self, btcep_id, btcep_pw):
+    def __init__(self, btcep_id, btcep_pw, upload_workers=8):
         self.driver = None
         self.main_url = 'https://btcep.humetro.busan.kr'
         self.menu_url = 'https://btcep.humetro.busan.kr/portal/default/main/eboard/eMenu'
         self.btcep_id = btcep_id
         self.btcep_pw = btcep_pw
         self.posts = None
-        self.post_idx = 0
+        self.wait_timeout = 10
+        # 기본 폴링 간격(0.5초)은 빠른 페이지에서 대기 시간을 늘리므로 줄인다.
+        self.poll_frequency = 0.1
+        self.upload_workers = upload_workers
+        # 업로드 스레드마다 keep-alive 커넥션 하나씩을 쓸 수 있도록 풀 크기를 맞춘다.
+        self.session = create_session(pool_maxsize=upload_workers)
         pass
 
-    def setup_webdriver(self, headless=True):
+    def setup_webdriver(self, headless=True, profile_dir=None):
         if self.driver is not None:
             return
 
         options = Options()
+        # DOM만 준비되면 되므로 이미지 등 나머지 리소스 로딩을 기다리지 않는다.
+        options.page_load_strategy = 'eager'
         options.add_argument('--start-maximzed')
         if headless:
             options.add_argument('-headless')
+        # 이미지는 src만 읽고 requests로 받으므로 브라우저에서는 불러오지 않는다.
+        options.set_preference('permissions.default.image', 2)
+        # 프로필을 재사용하면 쿠키가 남아 다음 실행부터 로그인을 건너뛸 수 있다.
+        if profile_dir:
+            options.add_argument('-profile')
+            options.add_argument(profile_dir)
 
         self.driver = webdriver.Firefox(options=options)
-        self.driver.implicitly_wait(10)
+        # implicit wait가 explicit wait와 겹치지 않도록 끈다.
+        self.driver.implicitly_wait(0)
 
     def _navigate_to_main(self):
         self.driver.get(self.main_url)
         pass
 
+    def _wait(self):
+        return WebDriverWait(self.driver, self.wait_timeout,
+                             poll_frequency=self.poll_frequency)
+
     def _navigate_to_menu_board(self):
         self.driver.get(self.menu_url)
-        time.sleep(3)
+        self._wait().until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'iframe')))
+
+    def _is_logged_in(self):
+        # eager 로딩이라 로그인 폼이 늦게 그려질 수 있으므로, 로그인 폼이나 로그인 후 포털 주소 중 하나가 나올 때까지 기다린다.
+        self._wait().until(EC.any_of(
+            EC.presence_of_element_located((By.ID, 'userId')),
+            EC.url_contains('/portal/')))
+        return not self.driver.find_elements(By.ID, 'userId')
 
     def _login(self):
+        if self._is_logged_in():
+            return
+
         self.driver.find_element(By.ID, 'userId').send_keys(self.btcep_id)
         self.driver.find_element(By.ID, 'password').send_keys(self.btcep_pw)
         self.driver.find_element(By.CSS_SELECTOR, 'a.btn_login').click()
-        self.driver.find_element(
-            By.CSS_SELECTOR, 'input#certi_num').send_keys(self.btcep_id)
+        self._wait().until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'input#certi_num'))).send_keys(self.btcep_id)
 
+        login_url = self.driver.current_url
         self.driver.execute_script('login()')
-        time.sleep(5)
+        self._wait().until(EC.url_changes(login_url))
         pass
 
     def _change_iframe(self):
         self.driver.switch_to.default_content()
-        table_frame = self.driver.find_element(By.CSS_SELECTOR, 'iframe')
-        self.driver.switch_to.frame(table_frame)
+        self._wait().until(
+            EC.frame_to_be_available_and_switch_to_it((By.CSS_SELECTOR, 'iframe')))
+
+    def _wait_for_board_rows(self):
+        wait_for_board_rows(self._wait())
 
     def _fetch_posts(self):
-        board_el = self.driver.find_element(By.CSS_SELECTOR, 'form#boardList')
-        self.posts = board_el.find_elements(By.CSS_SELECTOR, 'tbody tr')
+        self._wait_for_board_rows()
+        self.posts = self.driver.execute_script(POST_ROWS_SCRIPT)
         pass
 
     def _save_image(self):
@@ -78,17 +148,15 @@ class DietCrawler:
         files = {
             "upload_file": ('upload_file.jpg', post_data.get('image_content'), 'image/jpeg'),
         }
-        post_create_date = post_data.get('post_created_at').replace('.', '')
-
-        if len(post_create_date) > 6:
-            post_create_date = post_create_date[2:]
-
-        post_response = requests.post(post_endpoint,
-                                      data={
-                                          'post_title': post_data.get('post_title'),
-                                          'post_create_date': post_create_date},
-                                      files=files)
-        print(f'Uploading : {post_data.get('post_title')}')
+        post_create_date = post_data.get('post_created_at').strftime('%y%m%d')
+
+        post_response = self.session.post(post_endpoint,
+                                          data={
+                                              'post_title': post_data.get('post_title'),
+                                              'post_create_date': post_create_date},
+                                          files=files,
+                                          timeout=30)
+        print(f"Uploading : {post_data.get('post_title')}")
         print('Upload result : ', json.loads(post_response.content))
 
         pass
@@ -97,43 +165,76 @@ class DietCrawler:
         if image_url is None:
             raise ValueError("Image URL MUST not None!!!")
 
-        if 'data:image/png;base64' in image_url:
-            image_content = base64.b64decode(
-                self.image_url.split(',')[1].strip())
+        # 이미지를 bytes로 한번 더 복사하지 않도록 파일 객체로 넘긴다.
+        if image_url.startswith(BASE64_IMAGE_PREFIXES):
+            image_content = io.BytesIO(base64.b64decode(
+                image_url.split(',')[1].strip()))
         else:
-            response = requests.get(image_url)
-        # ToDo url이 아니라 base64 인코딩된 이미지 자체가 입력으로 들어온 경우 처리하기
+            response = self.session.get(image_url, stream=True, timeout=10)
             if response.status_code != 200:
+                response.close()
                 raise Exception('Failed to retrieve the file')
-            image_content = response.content
+            response.raw.decode_content = True
+            image_content = response.raw
 
         return image_content
 
     def _process_single_post(self, post):
+        # 식단표가 아닌 글은 브라우저를 건드리지 않고 바로 건너뛴다.
+        if not self.is_menu_post(post['title']):
+            return
+
         self._change_iframe()
+        # eager 로딩이라 프레임 안의 게시판 스크립트가 아직 없을 수 있으므로 글 목록이 그려질 때까지 기다린다.
+        self._wait_for_board_rows()
 
         post_data = {
-            'post_title': post.find_element(By.CSS_SELECTOR, 'td.L a').text,
-            'post_id': post.find_element(By.CSS_SELECTOR, 'td.L a').get_attribute('id'),
-            'post_created_at': post.find_elements(By.CSS_SELECTOR, 'td.C')[-2].text,
+            'post_title': post['title'],
+            'post_id': post['id'],
+            # 2023.10.22 형식의 작성일을 한번만 파싱해 date로 보관한다.
+            'post_created_at': datetime.datetime.strptime(post['created_at'], '%Y.%m.%d').date(),
             'image_url': None,
             'image_content': None,
         }
 
-        if '식단표' not in post_data.get('post_title'):
-            return
-
-        post_script = f"ebList.readBulletin('eMenu','{
-            post_data.get('post_id')}');"
-        self.driver.execute_script(post_script)
-        time.sleep(3)
-
-        post_data['image_url'] = self.driver.find_element(
-            By.CSS_SELECTOR, 'img').get_attribute('src')
+        self.driver.execute_script(
+            "ebList.readBulletin('eMenu', arguments[0]);", post_data.get('post_id'))
+        post_data['image_url'] = self._wait().until(diet_image_loaded)
+        return post_data
+
+    def _resolve_diet(self, post):
+        # 제목과 작성일만으로 식당과 시작일을 알 수 없는 글은 열어볼 필요가 없다.
+        try:
+            diet = Diet(Post(post['title'], post['created_at']))
+        except ValueError:
+            return None
+        if diet.location is None or diet.start_date is None:
+            return None
+        return diet
+
+    def _latest_menu_posts(self):
+        # 같은 식당, 같은 주의 식단표가 (수정) 등으로 여러번 올라온 경우 가장 최근 글만 남긴다.
+        latest = {}
+        for post in self.posts:
+            if not self.is_menu_post(post['title']):
+                continue
+            diet = self._resolve_diet(post)
+            if diet is None:
+                print(f"Skipping : {post['title']}")
+                continue
+            key = (diet.location, diet.yymmdd)
+            if key not in latest or post['created_at'] > latest[key]['created_at']:
+                latest[key] = post
+        return list(latest.values())
+
+    def _upload_post(self, post_data):
+        # 셀레니움과 무관한 작업이라 별도 스레드에서 실행된다.
         post_data['image_content'] = self._extract_image(
             post_data['image_url'])
-
-        self._post_to_server(post_data)
+        try:
+            self._post_to_server(post_data)
+        finally:
+            post_data['image_content'].close()
 
     def crawl(self):
         self._navigate_to_main()
@@ -142,19 +243,35 @@ class DietCrawler:
         self._change_iframe()
         self._fetch_posts()
 
-        # Implement this logic to avoid stale elem Exception
-        while self.post_idx < len(self.posts) - 1:
-            self._navigate_to_menu_board()
-            self._change_iframe()
-            self._fetch_posts()
+        # 드라이버는 스레드 안전하지 않으므로 셀레니움 작업은 순차로 하고,
+        # 이미지 다운로드와 업로드만 스레드풀에 넘긴다.
+        # 글 목록은 한번만 읽고, readBulletin으로 화면이 바뀐 뒤에만 게시판으로 돌아간다.
+        uploads = []
+        board_changed = False
+        with ThreadPoolExecutor(max_workers=self.upload_workers) as executor:
+            for post in self._latest_menu_posts():
+                if board_changed:
+                    self._navigate_to_menu_board()
+                board_changed = True
+                # 글 하나가 실패해도 나머지 글은 계속 처리한다.
+                try:
+                    post_data = self._process_single_post(post)
+                except WebDriverException as e:
+                    print(f"Failed : {post['title']}", e)
+                    post_data = None
+                if post_data is not None:
+                    uploads.append((post_data, executor.submit(self._upload_post, post_data)))
+
+        # 업로드 하나가 실패해도 나머지 결과는 모두 확인한다.
+        for post_data, upload in uploads:
             try:
-                self._process_single_post(self.posts[self.post_idx])
-            except NoSuchElementException:
-                pass
-            self.post_idx += 1
+                upload.result()
+            except Exception as e:
+                print(f"Upload failed : {post_data['post_title']}", e)
 
     def quit(self):
         self.driver.quit()
+        self.session.close()
 
     @staticmethod
     def is_menu_post(title: str) -> bool:
@@ -163,7 +280,9 @@ class DietCrawler:
 
 if __name__ == "__main__":
     crawler = DietCrawler(btcep_id, btcep_pw,)
-    crawler.setup_webdriver(headless=False)
-    crawler.crawl()
-    crawler.quit()
+    crawler.setup_webdriver(headless=False, profile_dir=btcep_profile_dir)
+    try:
+        crawler.crawl()
+    finally:
+        crawler.quit()
     sys.exit(0)
@@ -1,37 +1,85 @@
 import subprocess
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+PDF2HTMLEX_IMAGE = 'pdf2htmlex/pdf2htmlex:0.18.8.rc2-master-20200820-alpine-3.12.0-x86_64'
+# 컨테이너 하나에서 인자로 받은 pdf들을 차례로 변환하고, 실패한 파일명만 출력한다.
+PDF2HTMLEX_BATCH_SCRIPT = 'for f in "$@"; do pdf2htmlEX {options} "$f" >&2 || echo "$f"; done'
 
 class PDFConverter:
     def __init__(self):
         self.target_dir = os.path.join(os.getcwd(), 'miscs')
-        self.file_list = [i for i in os.listdir(self.target_dir) if '.pdf' in i]
+        with os.scandir(self.target_dir) as entries:
+            self.file_list = [entry.name for entry in entries
+                              if entry.is_file() and entry.name.lower().endswith('.pdf')]
 
     def batch_convert(self):
+        if not self.file_list:
+            return
+        # 파일마다 컨테이너를 띄우면 기동 비용이 파일 수만큼 들기 때문에,
+        # 코어 수만큼의 컨테이너에 파일을 나눠 주고 각 컨테이너가 여러 파일을 변환한다.
+        workers = min(4, os.cpu_count() or 2, len(self.file_list))
+        chunks = [self.file_list[i::workers] for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            failed = set().union(*executor.map(self.chunk_convert, chunks))
         for filename in self.file_list:
-            # filepath = os.path.join(self.target_dir, filename)
-            self.single_convert(filename)
+            if filename in failed:
+                print(f'Failure : {filename}')
+            else:
+                print(f'Success : {filename}')
+
+    def chunk_convert(self, file_list):
+        result = subprocess.run(
+            [
+               'docker',
+               'run',
+               '--rm',
+               '-v',
+               f'{self.target_dir}:/pdf',
+               '-w',
+               '/pdf',
+               '--entrypoint',
+               'sh',
+               PDF2HTMLEX_IMAGE,
+               '-c',
+               PDF2HTMLEX_BATCH_SCRIPT.format(options='--zoom 1.3'),
+               'sh',
+               *file_list,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=False,
+        )
+        if result.returncode != 0:
+            print(result.stderr)
+            return set(file_list)
+        return set(result.stdout.splitlines())
 
     def single_convert(self, filename):
         result = subprocess.run(
             [
                'docker',
                'run',
-               '-ti',
                '--rm',
                '-v',
                f'{self.target_dir}:/pdf',
                '-w',
                '/pdf',
-               'pdf2htmlex/pdf2htmlex:0.18.8.rc2-master-20200820-alpine-3.12.0-x86_64',
+               PDF2HTMLEX_IMAGE,
                '--zoom',
                '1.3',
                 filename,
-            ]
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=False,
         )
         if result.returncode == 0:
             print(f'Success : {filename}')
         else:
             print(f'Failure : {filename}')
+            print(result.stderr.decode(errors='replace'))
 
 if __name__ == "__main__":
     converter = PDFConverter()
@@ -12,10 +12,5 @@ class Post:
         self.url = None
         self.image_url = None
         self.target_date = get_next_monday(self.created_at)
-
-    @property
-    def is_diet(self):
-        if '식단표' in self.title:
-            return True
-        return False
+        self.is_diet = '식단표' in title
 
@@ -3,16 +3,97 @@ from typing import Dict, List
 import time
 import os
 import subprocess
+import shutil
 
 import datetime
-from urllib.parse import urlparse, parse_qs
+import functools
+import itertools
+from dataclasses import dataclass
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse, parse_qs
 
-import requests
-
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+from sqlalchemy import insert, update
 from database import SessionLocal
 
 from models import Regulation
+from utils.http_util import create_session
+from utils.html_util import class_xpath
+from PdfConverter import PDF2HTMLEX_IMAGE, PDF2HTMLEX_BATCH_SCRIPT
+
+# 변환 후 원본 파일을 남겨 둘지 여부. 디버깅할 때만 켠다.
+KEEP_DOWNLOADED_ORIGINALS = os.getenv('KEEP_DOWNLOADED_ORIGINALS', '').lower() in ('1', 'true', 'yes')
+
+
+# BeautifulSoup 트리를 만들지 않고 lxml 트리에서 필요한 부분만 바로 찾는다.
+_POST_TITLE_XPATH = etree.XPath(class_xpath('div', 'board-view-title'))
+_PREV_POST_LINK_XPATH = etree.XPath(class_xpath('li', 'li-prev') + '//a/@href')
+_FILE_LINK_XPATH = etree.XPath(class_xpath('ul', 'board-view-filelist') + '//a/@href')
+_CONTENTS_XPATH = etree.XPath("//div[@id='boardContents']")
+
+
+def _response_encoding(response):
+    # 파서에 bytes를 직접 넣으므로 인코딩을 알려줘야 한다.
+    # 헤더에 charset이 없으면 requests는 ISO-8859-1로 두므로 그때는 utf-8로 읽는다.
+    if 'charset' in response.headers.get('content-type', '').lower() and response.encoding:
+        return response.encoding
+    return 'utf-8'
+
+
+def _first_post_link(chunks, encoding='utf-8'):
+    # 게시판 목록은 첫 글 링크만 필요하므로 트리를 만들지 않고 태그 이벤트를 보다가 찾는 즉시 멈춘다.
+    parser = etree.HTMLPullParser(events=('start',), encoding=encoding)
+    in_table = in_tbody = False
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            if element.tag == 'table' and 'basic-list-table' in (element.get('class') or '').split():
+                in_table = True
+            elif in_table and element.tag == 'tbody':
+                in_tbody = True
+            elif in_tbody and element.tag == 'a' and element.get('href'):
+                return element.get('href')
+    raise ValueError('게시판에서 첫 번째 글을 찾을 수 없습니다.')
+
+
+def _parse_ymd(date_text):
+    # 작성일은 항상 YYYY-MM-DD 형식이므로 strptime의 포맷 해석 없이 바로 자른다.
+    if len(date_text) != 10 or date_text[4] != '-' or date_text[7] != '-':
+        raise ValueError(f'{date_text} 은 YYYY-MM-DD 형식이 아닙니다.')
+    return datetime.datetime(int(date_text[:4]), int(date_text[5:7]), int(date_text[8:10]))
+
+
+# 한 글자씩 지우는 replace 체인 대신 translate 한번으로 처리한다.
+_TAB_TABLE = str.maketrans('', '', '\t')
+_BRACKET_TABLE = str.maketrans('', '', '[]')
+_SPACE_TABLE = str.maketrans('', '', ' ')
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_filename(file_url, reg_type, title, create_date):
+    # 다운로드와 변환 단계에서 같은 파일명을 쓰므로 url 파싱은 한번만 한다.
+    query = parse_qs(urlparse(file_url).query)
+    _, dot, file_ext = query['file_name_origin'][0].rpartition('.')
+    # 확장자가 없으면 파일명 전체를 확장자로 쓰지 않도록 bin으로 둔다.
+    file_ext = file_ext.lower() if dot else 'bin'
+    filename = f'[{reg_type}]{title.replace(" ", "")}_{create_date}.{file_ext}'
+    return filename, file_ext
+
+
+@dataclass(slots=True)
+class RegulationError:
+    # 출력할 때만 문자열로 만든다.
+    reg_id: int
+    title: str
+    reason: str
+    detail: str = ''
+
+    def __str__(self) -> str:
+        return f'{self.title} (ID: {self.reg_id}) - {self.reason} {self.detail}'.rstrip()
+
+
 class RegulationPost:
     def __init__(self, post_type, post_title, post_create_date, post_file_url, post_enforce_date, post_next_link) -> None:
         self.type = post_type
@@ -31,18 +112,51 @@ class RegulationCrawler:
     ]
 
     db = SessionLocal()
+    http_cache_dir = os.path.join(os.getcwd(), 'miscs', 'http_cache')
 
     def __init__(self) -> None:
         self.current_post_info: Dict | None = dict()
-        self.error_list : List = []
+        self.error_list : List[RegulationError] = []
+        self.pending_pdfs : Dict[str, Regulation] = {}
+        # 변환이 끝난 규정의 html_url을 모았다가 한번에 반영한다.
+        self.pending_updates : List[Dict] = []
+        self.image_pull: subprocess.Popen | None = None
+        # 게시판과 글 페이지는 다시 돌려도 거의 바뀌지 않으므로 http 캐시를 거친다.
+        self.session = create_session(pool_maxsize=len(self.target_boards) + 1,
+                                      cache_dir=self.http_cache_dir)
+        # 규정 파일은 크고 한번만 받으면 되므로 캐시에 중복 저장하지 않는다.
+        self.download_workers = 4
+        self.download_session = create_session(pool_maxsize=self.download_workers)
+        # 원본을 남기는 설정이면 파일마다 분기하지 않도록 삭제 함수를 아예 바꿔 둔다.
+        if KEEP_DOWNLOADED_ORIGINALS:
+            self.remove_file = lambda file_path: None
+
+    @functools.cached_property
+    def converters(self) -> Dict:
+        # 확장자별 변환 함수를 한번만 만든다. 프로세스를 띄우지 않고 PATH에서 도구를 찾고,
+        # 도구가 있는 형식만 넣어 두므로 여기에 없는 형식은 받지도 않는다.
+        converters = {}
+        if shutil.which('hwp5html') is not None:
+            converters['hwp'] = self.convert_hwp
+        if shutil.which('docker') is not None:
+            converters['pdf'] = self.queue_pdf
+        return converters
+
+    def close(self) -> None:
+        self.session.close()
+        self.download_session.close()
 
     def handle_post(self, post_link) -> RegulationPost:
-        post_html = requests.get(self.base_url + post_link)
-        post_soup = BeautifulSoup(post_html.content, 'lxml')
-        post_text = post_soup.select_one('div.board-view-title').text
+        # 응답 전체를 bytes로 모았다가 다시 넘기지 않고, 받는 대로 파서에 흘려 넣는다.
+        with self.session.get(urljoin(self.base_url, post_link), stream=True, timeout=(5, 30)) as post_html:
+            parser = lxml.html.HTMLParser(encoding=_response_encoding(post_html))
+            for chunk in post_html.iter_content(chunk_size=16384):
+                parser.feed(chunk)
+        post_doc = parser.close()
+        post_text = _POST_TITLE_XPATH(post_doc)[0].text_content()
 
-        next_post_link_elem = post_soup.select_one('li.li-prev a')
-        post_next_link = next_post_link_elem.get('href') if next_post_link_elem else None
+        next_post_links = _PREV_POST_LINK_XPATH(post_doc)
+        post_next_link = next_post_links[0] if next_post_links else None
         
         # error handling for edge case
         if '정관' in post_text:
@@ -50,8 +164,8 @@ class RegulationCrawler:
         elif '조례' in post_text:
             post_text = '조례' + post_text
 
-        post_info_list = [i.strip() for i in post_text.replace('\t','').split('\n') if i.strip() != '']
-        post_type = post_info_list[0].replace('[', '').replace(']', '')
+        post_info_list = [line for line in (i.strip() for i in post_text.translate(_TAB_TABLE).split('\n')) if line]
+        post_type = post_info_list[0].translate(_BRACKET_TABLE)
         post_title = post_info_list[1]
 
         # error handling for edge case
@@ -59,61 +173,84 @@ class RegulationCrawler:
             post_type = '내규'
             post_title.replace('[내규]', '')
 
-        post_create_date = datetime.datetime.strptime(post_info_list[3], '%Y-%m-%d')
+        post_create_date = _parse_ymd(post_info_list[3])
         print('Processing ', post_type, post_title,)
         try:
-            post_file_url = post_soup.select_one('ul.board-view-filelist a').get('href')
+            post_file_url = _FILE_LINK_XPATH(post_doc)[0]
         except:
             post_file_url = None
 
         try:
-            post_enforce_date_text = post_soup.select_one('div#boardContents').text.strip().split(':')[1].strip().replace(' ', '')
+            post_enforce_date_text = _CONTENTS_XPATH(post_doc)[0].text_content().strip().split(':')[1].strip().translate(_SPACE_TABLE)
             post_enforce_date = datetime.datetime.strptime(post_enforce_date_text, '%Y년%m월%d일')
         except Exception as e:
             post_enforce_date = None
         return RegulationPost(post_type, post_title, post_create_date, post_file_url, post_enforce_date, post_next_link)
 
+    def fetch_board_posts(self, board) -> List[RegulationPost]:
+        # 첫 번째 글을 무조건 클릭한다.
+        with self.session.get(urljoin(self.base_url, board), stream=True, timeout=(5, 30)) as board_html:
+            next_link = _first_post_link(board_html.iter_content(chunk_size=16384), _response_encoding(board_html))
+
+        posts = []
+        while next_link:
+            post = self.handle_post(next_link)
+            posts.append(post)
+            next_link = post.next_link
+        return posts
+
     def crawl(self) -> None:
         try:
-            for board in self.target_boards:
-                board_html = requests.get(self.base_url + board)
-                board_soup = BeautifulSoup(board_html.content, 'lxml')
-                # 첫 번째 글을 무조건 클릭한다.
-                first_post = board_soup.select('table.basic-list-table tbody tr')[0]
-                next_link = first_post.select_one('a').get('href')
-
-                while next_link:
-                    post = self.handle_post(next_link)
-
-                    regulation = self.db.query(Regulation).filter_by(
-                        title = post.title,
-                        type = post.type
-                    ).first()
-
-                    if not regulation:
-                        print(post.title, 'not exists!')
-                        regulation = Regulation(
-                            title = post.title,
-                            type = post.type,
+            # 글마다 select 하지 않도록 기존 규정의 id와 작성일만 한번에 읽어 (제목, 종류)로 찾는다.
+            existing = {
+                (r.title, r.type): (r.id, r.create_date)
+                for r in self.db.query(Regulation.id, Regulation.title, Regulation.type, Regulation.create_date)
+            }
+            # 게시판끼리는 독립적이라 동시에 긁어오고, db 세션은 스레드 안전하지 않으므로 반영은 여기서 순서대로 한다.
+            with ThreadPoolExecutor(max_workers=len(self.target_boards)) as executor:
+                for posts in executor.map(self.fetch_board_posts, self.target_boards):
+                    new_regulations = {}
+                    updated_regulations = {}
+                    for post in posts:
+                        key = (post.title, post.type)
+                        values = dict(
                             create_date = post.create_date,
                             update_date = post.create_date,
                             enforce_date = post.enforce_date,
                             file_url = post.file_url,
                             html_url = None,
                         )
-                        self.db.add(regulation)
-                        self.db.commit()
-                    elif regulation.create_date < post.create_date:
-                        print(post.title, 'exists!, but outdated')
-                        regulation.create_date = post.create_date
-                        regulation.update_date = post.create_date
-                        regulation.enforce_date = post.enforce_date
-                        regulation.file_url = post.file_url
-                        regulation.html_url = None
+                        regulation_id, create_date = existing.get(key, (None, None))
+
+                        if create_date is None:
+                            print(post.title, 'not exists!')
+                            new_regulations[key] = dict(title = post.title, type = post.type, **values)
+                            existing[key] = (None, post.create_date)
+                        elif create_date < post.create_date:
+                            print(post.title, 'exists!, but outdated')
+                            if regulation_id is None:
+                                new_regulations[key].update(values)
+                            else:
+                                updated_regulations[regulation_id] = dict(id = regulation_id, **values)
+                            existing[key] = (regulation_id, post.create_date)
+                        else:
+                            print(post.title, 'same or newer version exists!, skipping')
+                    # 글마다 orm 객체를 만들고 커밋하지 않고, 게시판 단위로 모아서 한번에 쓴다.
+                    try:
+                        # 다음 게시판에서 같은 규정을 갱신할 수 있도록 새로 들어간 행의 id를 돌려받는다.
+                        inserted = []
+                        if new_regulations:
+                            inserted = self.db.execute(
+                                insert(Regulation).returning(Regulation.id, Regulation.title,
+                                                             Regulation.type, Regulation.create_date),
+                                list(new_regulations.values())).all()
+                        self.db.bulk_update_mappings(Regulation, list(updated_regulations.values()))
                         self.db.commit()
-                    else:
-                        print(post.title, 'same or newer version exists!, skipping')
-                    next_link = post.next_link
+                    except Exception:
+                        self.db.rollback()
+                        raise
+                    for r in inserted:
+                        existing[(r.title, r.type)] = (r.id, r.create_date)
         finally:
             self.db.close()
     
@@ -126,90 +263,195 @@ class RegulationCrawler:
         5. 다운로드된 파일을 지운다.
         6. 모든 과정이 성공하면 db에 html_url을 지정한다.
         """
-        targets = self.db.query(Regulation).filter_by(
-            html_url = None
-        ).all()
-
-        if subprocess.run(['hwp5html', '--version']).returncode != 0:
-            raise Exception('hwp5html is not installed')
-
-        for target in targets:
-            print('File Processing : ', target.title)
-            try:
-                self.download_file(target)
-                self.convert_file_to_html(target)
-                # self.remove_file(target)
-            except Exception as e:
-                print(e)
-                pass
-            # else:
-            #     # self.update_html_url(target)
-            # finally:
-            #     self.db.close()
+        # 파일명을 만들고 받는 데 필요한 컬럼만 읽고, orm 객체는 만들지 않는다.
+        # 전체를 한번에 메모리에 올리지 않도록 조금씩 읽어서 묶음 단위로 처리한다.
+        targets = self.db.query(Regulation).with_entities(
+            Regulation.id,
+            Regulation.title,
+            Regulation.type,
+            Regulation.create_date,
+            Regulation.file_url,
+        ).filter(Regulation.html_url.is_(None), Regulation.file_url.isnot(None)).yield_per(200)
+
+        # 다운로드는 네트워크를 기다리는 일이라 여러 개를 동시에 받고,
+        # 변환은 외부 프로세스가 cpu를 쓰므로 받은 파일부터 별도의 풀에서 동시에 변환한다.
+        with ThreadPoolExecutor(max_workers=self.download_workers) as downloader, \
+                ThreadPoolExecutor(max_workers=os.cpu_count() or 2) as converter:
+            conversions = {}
+            # Query는 순회할 때마다 다시 실행되므로 결과 하나를 열어 두고 그 안에서 잘라 쓴다.
+            rows = iter(targets)
+            for batch in iter(lambda: list(itertools.islice(rows, 64)), []):
+                downloads = {}
+                for target in batch:
+                    file_ext = _parse_filename(target.file_url, target.type, target.title, target.create_date.date())[1]
+                    if file_ext not in self.converters:
+                        print(f'No converter for {file_ext}, skipping : ', target.title)
+                        self.error_list.append(RegulationError(target.id, target.title, 'no_converter', file_ext))
+                        continue
+                    # pdf가 있으면 다운로드하는 동안 미리 이미지를 받아 두어 첫 변환이 pull을 기다리지 않게 한다.
+                    if file_ext == 'pdf' and self.image_pull is None:
+                        self.image_pull = subprocess.Popen(['docker', 'pull', PDF2HTMLEX_IMAGE],
+                                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    downloads[downloader.submit(self.download_file, target)] = (target, file_ext)
+
+                for download in as_completed(downloads):
+                    target, file_ext = downloads[download]
+                    print('File Processing : ', target.title)
+                    try:
+                        download.result()
+                    except Exception as e:
+                        print(e)
+                        self.error_list.append(RegulationError(target.id, target.title, 'download_failed', str(e)))
+                        continue
+                    if file_ext == 'pdf':
+                        # pdf는 목록에 쌓기만 하므로 바로 처리해서, 아래 일괄 변환 전에 빠짐없이 들어가게 한다.
+                        self.convert_file_to_html(target)
+                    else:
+                        conversions[converter.submit(self.convert_file_to_html, target)] = target
+
+            # 다운로드가 끝나면 남은 hwp 변환을 기다리지 않고 pdf 일괄 변환도 같이 돌린다.
+            conversions[converter.submit(self.convert_pending_pdfs)] = None
+            for conversion in as_completed(conversions):
+                try:
+                    conversion.result()
+                except Exception as e:
+                    print(e)
+        self.update_html_urls()
             
 
     def check_file_exists(self) -> None:
         pass
+
+    def remove_file(self, file_path) -> None:
+        # 변환이 끝난 원본은 지운다. 이미 없으면 넘어간다.
+        try:
+            Path(file_path).unlink(missing_ok=True)
+        except OSError as e:
+            print('File removing failed : ', file_path, e)
     
     def download_file(self, target: Regulation) -> None:
-        file_ext = parse_qs(urlparse(target.file_url).query).get('file_name_origin')[0].split('.')[-1].lower()
-        filename = f'[{target.type}]{target.title.replace(" ", "")}_{target.create_date.date()}.{file_ext}' 
+        filename, file_ext = _parse_filename(target.file_url, target.type, target.title, target.create_date.date())
+        file_path = os.path.join('miscs', filename)
+        file_url = urljoin(self.base_url, target.file_url)
+        if self.is_downloaded(file_url, file_path):
+            print('File already downloaded : ', filename)
+            return
         print('File downloading : ', filename)
-        with open('miscs/' + filename, 'wb') as f:
-            res = requests.get(self.base_url + target.file_url)
-            f.write(res.content)
+        part_path = file_path + '.part'
+        # 파일 전체를 메모리에 올리지 않고 소켓에서 디스크로 바로 복사한다.
+        # 중간에 끊기면 잘린 파일이 변환되지 않도록 다 받은 뒤에만 원래 이름으로 바꾼다.
+        try:
+            with self.download_session.get(file_url, stream=True, timeout=(5, 60)) as res:
+                res.raise_for_status()
+                res.raw.decode_content = True
+                with open(part_path, 'wb') as f:
+                    shutil.copyfileobj(res.raw, f, length=65536)
+            os.replace(part_path, file_path)
+        finally:
+            Path(part_path).unlink(missing_ok=True)
         time.sleep(1)
     
-    def update_html_url(self, target:Regulation) -> None:
-        target.html_url = ""
-        self.db.commit()
-        pass
+    def is_downloaded(self, file_url, file_path) -> bool:
+        # 파일명에 작성일이 들어가므로, 같은 이름의 파일이 있고 크기가 같으면 다시 받지 않는다.
+        # 있는지 확인하고 크기를 다시 읽지 않도록 stat은 한번만 한다.
+        try:
+            local_size = os.path.getsize(file_path)
+        except OSError:
+            return False
+        try:
+            res = self.download_session.head(file_url, allow_redirects=True, timeout=10)
+        except Exception:
+            return False
+        content_length = res.headers.get('Content-Length')
+        return res.ok and content_length is not None and int(content_length) == local_size
+
+    def update_html_urls(self) -> None:
+        if not self.pending_updates:
+            return
+        # 규정마다 커밋하지 않고 id 기준 bulk update 한번으로 반영한다.
+        try:
+            self.db.execute(update(Regulation), self.pending_updates)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            self.error_list.extend(RegulationError(values['id'], '', 'db_update_failed', str(e))
+                                   for values in self.pending_updates)
+            raise
+        finally:
+            self.pending_updates = []
     
     def convert_file_to_html(self, target: Regulation) -> None:
-        file_ext = parse_qs(urlparse(target.file_url).query).get('file_name_origin')[0].split('.')[-1].lower()
-        filename = f'[{target.type}]{target.title.replace(" ", "")}_{target.create_date.date()}.{file_ext}' 
-        file_dir = os.path.join(os.getcwd(), 'miscs')
-        file_path = os.path.join(file_dir, filename)
-        hwp_dest = os.path.join(os.getcwd(), 'assets', 'html', '_regulation', filename.replace('.hwp', ''))
-        pdf_dest = os.path.join(os.getcwd(), 'assets', 'html', '_regulation', filename.replace('.pdf', ''))
+        filename, file_ext = _parse_filename(target.file_url, target.type, target.title, target.create_date.date())
         print('File converting : ', filename)
-        if 'hwp' in file_ext:
-            result = subprocess.run(['hwp5html', '--output', hwp_dest, file_path])
-            if result.returncode != 0:
-                self.error_list.append(filename)
-                raise Exception(f'{filename} 이 정상 변환되지 않았습니다.')
-        elif 'pdf' in file_ext:
-            """
-                1. 도커가 설치되어 있는지 확인한다.
-                2. 도커 이미지를 풀링한다.
-                3. 도커 풀된 도커 이미지를 바탕으로 커맨드를 실행한다.
-            """
-            print('pdf')
-            result = subprocess.run(
-                [
-                   'docker',
-                   'run',
-                   '-ti',
-                   '--rm',
-                   '-v',
-                   f'{file_dir}/:/pdf',
-                   '-w',
-                   '/pdf',
-                   'pdf2htmlex/pdf2htmlex:0.18.8.rc2-master-20200820-alpine-3.12.0-x86_64',
-                   '--dest-dir',
-                   pdf_dest,
-                   '--zoom',
-                   '1.3',
-                    filename,
-                ]
-            )
+        self.converters[file_ext](target, filename)
+
+    def convert_hwp(self, target: Regulation, filename: str) -> None:
+        file_path = os.path.join(os.getcwd(), 'miscs', filename)
+        hwp_dest = os.path.join(os.getcwd(), 'assets', 'html', '_regulation', filename.replace('.hwp', ''))
+        result = subprocess.run(['hwp5html', '--output', hwp_dest, file_path])
         if result.returncode != 0:
-            self.error_list.append(filename)
+            self.error_list.append(RegulationError(target.id, target.title, 'hwp_convert_failed', filename))
             raise Exception(f'{filename} 이 정상 변환되지 않았습니다.')
+        self.pending_updates.append({'id': target.id, 'html_url': os.path.basename(hwp_dest)})
+        self.remove_file(file_path)
+
+    def queue_pdf(self, target: Regulation, filename: str) -> None:
+        # pdf는 모아 두었다가 convert_pending_pdfs에서 컨테이너 하나로 한번에 변환한다.
+        self.pending_pdfs[filename] = target
+
+    def convert_pending_pdfs(self) -> None:
+        if not self.pending_pdfs:
+            return
+        if self.image_pull is not None:
+            self.image_pull.wait()
+            self.image_pull = None
+        file_dir = os.path.join(os.getcwd(), 'miscs')
+        dest_dir = os.path.join(os.getcwd(), 'assets', 'html', '_regulation')
+        print('Pdf converting : ', len(self.pending_pdfs), 'files')
+        result = subprocess.run(
+            [
+               'docker',
+               'run',
+               '--rm',
+               '-v',
+               f'{file_dir}/:/pdf',
+               '-v',
+               f'{dest_dir}/:/out',
+               '-w',
+               '/pdf',
+               '--entrypoint',
+               'sh',
+               PDF2HTMLEX_IMAGE,
+               '-c',
+               PDF2HTMLEX_BATCH_SCRIPT.format(options='--dest-dir "/out/${f%.pdf}" --zoom 1.3'),
+               'sh',
+               *self.pending_pdfs,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=False,
+        )
+        if result.returncode != 0:
+            print(result.stderr)
+            failed = set(self.pending_pdfs)
+        else:
+            # 파일마다 목록을 훑지 않도록 실패한 파일명은 set으로 들고 있는다.
+            failed = set(result.stdout.splitlines())
+        for filename, target in self.pending_pdfs.items():
+            if filename in failed:
+                self.error_list.append(RegulationError(target.id, target.title, 'pdf_convert_failed', filename))
+            else:
+                self.pending_updates.append({'id': target.id, 'html_url': filename.replace('.pdf', '')})
+                self.remove_file(os.path.join(file_dir, filename))
+        self.pending_pdfs = {}
 
 
 if __name__ == "__main__":
     crawler = RegulationCrawler()
     # crawler.crawl()
     crawler.handle_file_process()
-    print(crawler.error_list)
\ No newline at end of file
+    crawler.close()
+    # 오류 목록은 한번에 모아서 출력한다.
+    if crawler.error_list:
+        print('Errors:\n' + '\n'.join(f' - {error}' for error in crawler.error_list))
\ No newline at end of file
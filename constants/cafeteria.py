@@ -1,2 +1,21 @@
+import re
+
+__all__ = ['cafeteria_full_name_list', 'cafeteria_semi_name_list', 'find_cafeteria_index']
+
 cafeteria_full_name_list = ['본사', '노포', '신평', '호포', '광안', '대저', '경전철', '안평']
-cafeteria_semi_name_list = ['ㅂㅅ', 'ㄴㅍ', 'ㅅㅍ', 'ㅎㅍ', 'ㄱㅇ', 'ㄷㅈ', 'ㄱㅈㅊ', 'ㅇㅍ']
\ No newline at end of file
+cafeteria_semi_name_list = ['ㅂㅅ', 'ㄴㅍ', 'ㅅㅍ', 'ㅎㅍ', 'ㄱㅇ', 'ㄷㅈ', 'ㄱㅈㅊ', 'ㅇㅍ']
+
+# 식당명마다 in 검사를 반복하지 않도록 모든 이름을 하나의 패턴으로 묶어 문자열을 한번만 훑는다.
+_FULL_NAME_INDEX = {name: idx for idx, name in enumerate(cafeteria_full_name_list)}
+_ANY_NAME_INDEX = {**{name: idx for idx, name in enumerate(cafeteria_semi_name_list)}, **_FULL_NAME_INDEX}
+_FULL_NAME_RE = re.compile('|'.join(map(re.escape, cafeteria_full_name_list)))
+_ANY_NAME_RE = re.compile('|'.join(map(re.escape, _ANY_NAME_INDEX)))
+
+
+def find_cafeteria_index(text, include_semi_names=False):
+    # 여러 식당명이 들어있으면 기존처럼 목록에서 앞선 식당을 고른다.
+    if include_semi_names:
+        indexes = [_ANY_NAME_INDEX[name] for name in _ANY_NAME_RE.findall(text)]
+    else:
+        indexes = [_FULL_NAME_INDEX[name] for name in _FULL_NAME_RE.findall(text)]
+    return min(indexes) if indexes else None
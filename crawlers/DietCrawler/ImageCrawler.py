@@ -1,22 +1,35 @@
-import requests
 import datetime
 import time
 import re
+import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import Select
-from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.support.ui import Select, WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.firefox.options import Options
 
 from Post import Post
 from Diet import Diet
+from DietCrawler import POST_ROWS_SCRIPT, diet_image_loaded, wait_for_board_rows
+from utils.http_util import create_session
+
+_DATE_RE = re.compile(r'\((\d+)/(\d+)~(\d+)/?(\d+)?\)')
+# Define a regular expression pattern for invalid characters in Windows filenames
+# This pattern matches any character that is not a letter, number, underscore, hyphen, or period
+_INVALID_FN_RE = re.compile(r'[^\w\-.]')
+# 식당명 후보를 하나의 패턴으로 묶어 제목을 한번만 훑는다.
+_LOC_RE = re.compile('본사|신평|대저|노포|호포|경전철|광안')
 
 my_id = "115232"
 my_pw = "ss!!!79975"
 
 
+session = create_session(pool_maxsize=10)
+
 # Path to the GeckoDriver executable (replace with your actual path)
 geckodriver_path = './geckodriver.exe'
 
@@ -27,25 +40,28 @@ options.add_argument("--start-maximized")
 
 # Initialize the WebDriver with the options
 driver = webdriver.Firefox(options=options)
+# 고정 sleep 대신 필요한 요소가 나타날 때까지만 기다린다.
+wait = WebDriverWait(driver, 10)
+# 폴링할 때마다 스크립트 한번으로 src만 읽어서 가벼우므로 조금 더 자주 확인한다.
+image_wait = WebDriverWait(driver, 15, poll_frequency=0.25)
 
 # Navigate to a website
 driver.get('https://btcep.humetro.busan.kr/')
-driver.implicitly_wait(10)
 print(driver.title)
 
-driver.find_element(By.ID, 'userId').send_keys(my_id)
+wait.until(EC.presence_of_element_located((By.ID, 'userId'))).send_keys(my_id)
 driver.find_element(By.ID, 'password').send_keys(my_pw)
 driver.find_element(By.CSS_SELECTOR, 'a.btn_login').click()
-driver.find_element(By.CSS_SELECTOR, 'input#certi_num').send_keys(my_id)
+wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'input#certi_num'))).send_keys(my_id)
 
+login_url = driver.current_url
 driver.execute_script('login()')
-time.sleep(5)
+wait.until(EC.url_changes(login_url))
 
 
 def change_frame():
     driver.switch_to.default_content()
-    table_frame = driver.find_element(By.CSS_SELECTOR, 'iframe')
-    driver.switch_to.frame(table_frame)
+    wait.until(EC.frame_to_be_available_and_switch_to_it((By.CSS_SELECTOR, 'iframe')))
 
 def change_pagesize_to_40():
     # interact with select options
@@ -54,9 +70,8 @@ def change_pagesize_to_40():
     select.select_by_index(3)
 
 def parse_date_from_title(date_string):
-    pattern = r'\((\d+)/(\d+)~(\d+)\/?(\d+)?\)'
     # pattern = r'(\d{1,2}/\d{1,2}(?:\s*~\s*\d{1,2}/\d{1,2})?)'
-    match = re.search(pattern, date_string)
+    match = _DATE_RE.search(date_string)
 
     if match:
         print(match.groups())
@@ -79,18 +94,13 @@ def parse_date_from_title(date_string):
         raise Exception("날짜 형식이 올바르지 않습니다.")
 
 def parse_loc_from_title(title):
-    location = None
-    locations = ['본사', '신평', '대저', '노포', '호포', '경전철', '광안']
-    for loc in locations:
-        if loc in title:
-            location = loc
-    # 날짜를 파싱
-    if location is None:
+    match = _LOC_RE.search(title)
+    if match is None:
         raise Exception("식당명을 찾을 수 없습니다.")
-    return loc
+    return match.group(0)
 
 def save_image(title, image_url):
-    response = requests.get(image_url)
+    response = session.get(image_url, timeout=(3, 10), stream=True)
 
     # Check if the request was successful (status code 200)
     if response.status_code == 200:
@@ -98,20 +108,25 @@ def save_image(title, image_url):
         local_image_path = f'{title}-{int(time.time())}.jpg'  # Change the filename and extension as needed
 
         # Save the image to the local file
+        response.raw.decode_content = True
         with open(local_image_path, 'wb') as image_file:
-            image_file.write(response.content)
+            shutil.copyfileobj(response.raw, image_file)
 
         print(f"Image downloaded to {local_image_path}")
     else:
         print(f"Failed to download image. Status code: {response.status_code}")
+    response.close()
 
-def sanitize_filename(filename):
-    # Define a regular expression pattern for invalid characters in Windows filenames
-    # This pattern matches any character that is not a letter, number, underscore, hyphen, or period
-    invalid_char_pattern = r'[^\w\-.]'
+def upload_diet(diet):
+    try:
+        diet.upload_image_to_server()
+    except Exception as e:
+        print(f'below exception raised while uploading {diet.title}')
+        print(e)
 
-    # Use re.sub to replace invalid characters with an empty string
-    sanitized_filename = re.sub(invalid_char_pattern, '', filename)
+def sanitize_filename(filename):
+    # Replace invalid characters with an empty string
+    sanitized_filename = _INVALID_FN_RE.sub('', filename)
 
     return sanitized_filename
     
@@ -119,43 +134,52 @@ menu_url = "https://btcep.humetro.busan.kr/portal/default/main/eboard/eMenu"
 # driver.get(menu_url)
 # change_frame()
 
-for i in range(19, -1, -1):
+# 게시판은 한번만 열고 최근 20개 글의 정보를 스크립트 한번으로 읽어온다.
+driver.get(menu_url)
+change_frame()
+wait_for_board_rows(wait)
+rows = driver.execute_script(POST_ROWS_SCRIPT)
+
+# 식단표가 아닌 글은 글을 열거나 게시판으로 돌아가기 전에 미리 걸러낸다.
+diet_rows = [row for row in reversed(rows[:20]) if '식단표' in row['title']]
+
+# 셀레니움으로는 이미지 주소만 모으고, 다운로드와 업로드는 루프가 끝난 뒤 병렬로 처리한다.
+diets = []
+board_changed = False
+for row in diet_rows:
+    title = row['title']
     try:
-        driver.get(menu_url)
-        time.sleep(3)
-        change_frame()
-        board_el = driver.find_element(By.CSS_SELECTOR, 'form#boardList')
-        pages = board_el.find_elements(By.CSS_SELECTOR, 'tbody tr td.L a')
-        page = pages[i]
-        title = page.text
-        page_id = page.get_attribute('id')
-        page_script = f"ebList.readBulletin('eMenu','{page_id}');"
-        page_created_at = page.parent.find_elements(By.CLASS_NAME, 'C')[-2].text
         print('Processing : ', title)
-        post = Post(title, page_created_at)
+        post = Post(title, row['created_at'])
         print(post.title, post.create_date)
-        if post.is_diet:
-            driver.execute_script(page_script)
-            time.sleep(3)
+        # readBulletin으로 화면이 바뀐 뒤에만 게시판을 다시 연다.
+        if board_changed:
+            driver.get(menu_url)
+            change_frame()
+            wait_for_board_rows(wait)
+        board_changed = True
+        driver.execute_script("ebList.readBulletin('eMenu', arguments[0]);", row['id'])
+        try:
+            diet = Diet(post)
             try:
-                diet = Diet(post)
-                diet.image_url = driver.find_element(By.CSS_SELECTOR, 'img').get_attribute('src')
-                print(diet.image_url)
-                err_count = 5
-                while err_count and 'icon_new' in diet.image_url:
-                    err_count -= 1
-                    driver.execute_script("window.scrollBy(0, 500);")
-                    print(f'error, retrying {err_count}')
-                    driver.execute_script(page_script)
-                    time.sleep(3)
-                    diet = Diet(post)
-                    diet.image_url = driver.find_element(By.CSS_SELECTOR, 'img').get_attribute('src')
-                diet.upload_image_to_server()
-            except NoSuchElementException:
-                print('element not found - ', title)
+                diet.image_url = image_wait.until(diet_image_loaded)
+            except TimeoutException:
+                # 이미지가 icon_new에서 바뀌지 않으면 스크롤 후 글을 한번 더 연다.
+                print('image not replaced, retrying - ', title)
+                driver.execute_script("window.scrollBy(0, 500);")
+                driver.execute_script("ebList.readBulletin('eMenu', arguments[0]);", row['id'])
+                diet.image_url = image_wait.until(diet_image_loaded)
+            print(diet.image_url)
+            diets.append(diet)
+        except TimeoutException:
+            print('image not loaded - ', title)
     except Exception as e:
         print(f'below exception raised while handling {title}')
         print(e)
 
 driver.quit()
+
+with ThreadPoolExecutor(max_workers=10) as executor:
+    list(executor.map(upload_diet, diets))
+
 sys.exit(0)
\ No newline at end of file
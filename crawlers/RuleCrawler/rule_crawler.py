@@ -1,11 +1,30 @@
-import requests
+import datetime
 import json
 import re
-from bs4 import BeautifulSoup
+from urllib.parse import urljoin
+import lxml.html
+from lxml import etree
 from database import SessionLocal
 from models import Regulation
+from utils.http_util import create_session
+from utils.html_util import class_xpath
+
+_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+_RULE_TITLE_XPATH = etree.XPath('string(' + class_xpath('div', 'board-view-title') + class_xpath('h3', 'bv-tit') + ')')
+_CREATED_AT_XPATH = etree.XPath('string(' + class_xpath('div', 'board-view-title') + ')')
+_FILE_LINK_XPATH = etree.XPath(class_xpath('ul', 'board-view-filelist') + '//li/a/@href')
+_PREV_POST_LINK_XPATH = etree.XPath(class_xpath('li', 'li-prev') + '//a/@href')
+
+# 목록 페이지의 행에 제목, 작성일, 첨부파일 링크가 같이 있다.
+_LIST_ROW_XPATH = etree.XPath(class_xpath('table', 'basic-list-table') + '/tbody/tr')
+_ROW_TITLE_XPATH = etree.XPath('string(.//a)')
+_ROW_POST_LINK_XPATH = etree.XPath('.//a/@href')
+_ROW_FILE_LINK_XPATH = etree.XPath(".//a[contains(@href, 'file_name_origin')]/@href")
 
 class RegulationCrawler:
+    base_url = "http://www.humetro.busan.kr"
     target_boards = [
         "http://www.humetro.busan.kr/homepage/default/board/list.do?conf_no=106&board_no=&category_cd=&menu_no=1001060301",
         "http://www.humetro.busan.kr/homepage/default/board/list.do?conf_no=105&board_no=&category_cd=&menu_no=1001060302",
@@ -15,41 +34,76 @@ class RegulationCrawler:
     db = SessionLocal()
 
     def __init__(self) -> None:
-        pass
+        self.session = create_session(pool_maxsize=4)
+
+    def close(self) -> None:
+        self.session.close()
 
     def crawl(self) -> None:
-        for board in self.target_boards:
-            """
-            1. get lists,
-            2. access individual posts
-            3. db commit, file download, convert
-            """
-            board_html = requests.get(board)
-            board_soup = BeautifulSoup(html.content, 'lxml')
-            # 첫 번째 글을 무조건 클릭한다.
-            first_post = board_soup.select('table.basic-list-table tbody tr')[0]
-            first_post_link = first_post.select_one('a').get('href')
-
-            post_html = requests.get(first_post_link)
-            post_soup = BeautifulSoup(html, 'lxml')
-            while True:
-                regulation_title = post_soup.select()
-                regulation_type
-                enforce_date
-                file_url
-                html_url
-                self.db.Query(Regulation)
-
-                # 포스트가 없거나, db에 현재 포스트의 내용이 저장된 경우 break한다.
-
-            rule_title = soup.select_one('div.board-view-title h3.bv-tit').text.strip()
-            pattern = '\d{4}-\d{2}-\d{2}'
-            created_at_el = soup.select_one('div.board-view-title')
-            created_at_text = created_at_el.text
-            created_at_text = re.search(pattern, created_at_text)[0]
-            break
-        pass
-    
+        """
+        1. 게시판 목록 페이지에서 제목, 작성일, 파일 링크를 바로 읽는다.
+        2. 목록에 파일 링크가 없는 글만 상세 페이지를 연다.
+        3. 게시판 단위로 모아서 db에 한번에 쓴다.
+        """
+        try:
+            existing_titles = {title for title, in self.db.query(Regulation.title)}
+            for board in self.target_boards:
+                new_regulations = []
+                page = 1
+                while True:
+                    board_html = self.session.get(f'{board}&c_page={page}', timeout=(5, 30))
+                    rows = _LIST_ROW_XPATH(lxml.html.fromstring(board_html.content))
+                    if not rows:
+                        break
+
+                    has_new_post = False
+                    for row in rows:
+                        rule_title = _ROW_TITLE_XPATH(row).strip()
+                        if not rule_title or rule_title in existing_titles:
+                            continue
+                        has_new_post = True
+
+                        created_at_match = _DATE_RE.search(row.text_content())
+                        file_links = _ROW_FILE_LINK_XPATH(row)
+                        if created_at_match is None or not file_links:
+                            # 목록에 없는 정보만 상세 페이지에서 채운다.
+                            post_links = _ROW_POST_LINK_XPATH(row)
+                            if not post_links:
+                                continue
+                            post_html = self.session.get(urljoin(self.base_url, post_links[0]), timeout=(5, 30))
+                            post_doc = lxml.html.fromstring(post_html.content)
+                            if created_at_match is None:
+                                created_at_match = _DATE_RE.search(_CREATED_AT_XPATH(post_doc))
+                            if not file_links:
+                                file_links = _FILE_LINK_XPATH(post_doc)
+                        if created_at_match is None:
+                            print(rule_title, 'no created date, skipping')
+                            continue
+
+                        created_at = datetime.datetime.strptime(created_at_match[0], '%Y-%m-%d')
+                        print('Processing ', rule_title)
+                        new_regulations.append(dict(
+                            title = rule_title,
+                            create_date = created_at,
+                            update_date = created_at,
+                            file_url = urljoin(self.base_url, file_links[0]) if file_links else None,
+                        ))
+                        existing_titles.add(rule_title)
+
+                    # 최신 글부터 나오므로 한 페이지가 모두 저장된 글이면 그 뒤도 저장되어 있다.
+                    if not has_new_post:
+                        break
+                    page += 1
+
+                try:
+                    self.db.bulk_insert_mappings(Regulation, new_regulations)
+                    self.db.commit()
+                except Exception:
+                    self.db.rollback()
+                    raise
+        finally:
+            self.db.close()
+
     def check_exists(self) -> None:
         pass
     
@@ -62,55 +116,54 @@ class RegulationCrawler:
 if __name__ == "__main__":
     crawler = RegulationCrawler()
     crawler.crawl()
+    crawler.close()
     
 
 init_url = "http://www.humetro.busan.kr/homepage/default/board/view.do?board_no=2309XUAL2X&conf_no=106&menu_no=1001060301&c_page=1&geulmeori=&search_key=&keyword="
 base_url = "http://www.humetro.busan.kr"
 target_url = init_url
-
-rules = []
-
-duplicate = False
-while True:
-    html = requests.get(target_url)
-    soup = BeautifulSoup(html.content, 'lxml')
-    rule_title = soup.select_one('div.board-view-title h3.bv-tit').text.strip()
-    pattern = '\d{4}-\d{2}-\d{2}'
-    created_at_el = soup.select_one('div.board-view-title')
-    created_at_text = created_at_el.text
-    created_at_text = re.search(pattern, created_at_text)[0]
-
-    file_url_el = soup.select_one('ul.board-view-filelist li a')
-    file_url_text = file_url_el.get('href')
-    file_url_text = base_url + file_url_text
-
-    next_link_el = soup.select_one('li.li-prev a')
-    if next_link_el is None:
-        print('no next link!! terminating!!')
-        break
-
-    next_link_text = next_link_el.get('href')
-    next_link_text = base_url + next_link_text
-
-    print(rule_title)
-    print(created_at_text)
-    print(file_url_text)
-    print(next_link_text)
-
-    for rule in rules:
-        if rule_title == rule.get('title'):
-            duplicate = True
+session = create_session(pool_maxsize=4)
+
+# 제목 중복은 set으로 확인하고, 규정은 찾는 대로 파일에 써서 중간에 멈춰도 앞부분이 남게 한다.
+seen_titles = set()
+rules_file = open('rules.json', 'w', encoding='utf-8')
+rules_file.write('[')
+try:
+    while True:
+        html = session.get(target_url, timeout=(5, 30))
+        doc = lxml.html.fromstring(html.content)
+        rule_title = _RULE_TITLE_XPATH(doc).strip()
+        created_at_text = _DATE_RE.search(_CREATED_AT_XPATH(doc))[0]
+
+        file_url_text = _FILE_LINK_XPATH(doc)[0]
+        file_url_text = base_url + file_url_text
+
+        next_links = _PREV_POST_LINK_XPATH(doc)
+        if not next_links:
+            print('no next link!! terminating!!')
             break
 
-    if not duplicate:
-        rules.append({
-            "title":rule_title,
-            "created_at":created_at_text,
-            "file_url": file_url_text,
-        })
-
-    target_url = next_link_text
-    duplicate = False
-
-with open('rules.json', 'w') as f:
-    json.dump(rules, f, indent=4, ensure_ascii=False)
\ No newline at end of file
+        next_link_text = next_links[0]
+        next_link_text = base_url + next_link_text
+
+        print(rule_title)
+        print(created_at_text)
+        print(file_url_text)
+        print(next_link_text)
+
+        if rule_title not in seen_titles:
+            rule = {
+                "title":rule_title,
+                "created_at":created_at_text,
+                "file_url": file_url_text,
+            }
+            rules_file.write(',\n' if seen_titles else '\n')
+            rules_file.write(json.dumps(rule, indent=4, ensure_ascii=False))
+            rules_file.flush()
+            seen_titles.add(rule_title)
+
+        target_url = next_link_text
+finally:
+    rules_file.write('\n]')
+    rules_file.close()
+    session.close()
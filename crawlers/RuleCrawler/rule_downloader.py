@@ -1,25 +1,39 @@
 import json
-import requests
 import os
+import shutil
+from pathlib import Path
 
+from utils.http_util import create_session
+
+
+session = create_session(pool_maxsize=1)
 
 with open('rules.json', 'r', encoding='utf-8') as f:
     rules = json.load(f)
     for rule in rules:
         print(rule)
-        res = requests.get(rule['file_url'])
-        file_content = res.content
-        file_name = f'{rule["title"]}_{rule["created_at"]}.hwp' 
+        file_name = f'{rule["title"]}_{rule["created_at"]}.hwp'
         file_name = file_name.replace(' ', '_')
+        # 이미 받은 파일은 요청 자체를 보내지 않는다.
         if os.path.exists(file_name):
             print(file_name, 'already processed')
             continue
         else:
             try:
-                with open(file_name, 'wb') as hwp_file:
-                    hwp_file.write(file_content)
+                # 파일 전체를 메모리에 올리지 않고 큰 버퍼 단위로 디스크에 바로 쓴다.
+                # 다 받은 뒤에만 이름을 바꿔서 잘린 파일이 처리된 것으로 보이지 않게 한다.
+                try:
+                    with session.get(rule['file_url'], stream=True, timeout=(5, 120)) as res:
+                        res.raise_for_status()
+                        res.raw.decode_content = True
+                        with open(file_name + '.part', 'wb', buffering=1 << 20) as hwp_file:
+                            shutil.copyfileobj(res.raw, hwp_file, length=1 << 20)
+                    os.replace(file_name + '.part', file_name)
+                finally:
+                    # 중간에 실패하면 받다 만 파일을 남기지 않는다.
+                    Path(file_name + '.part').unlink(missing_ok=True)
                 print(rule['title'], 'saving is done')
-                
+
                 command = f"hwp5html {os.path.join(os.getcwd(), file_name)}"
                 return_code = os.system(command)
 
@@ -30,4 +44,4 @@ with open('rules.json', 'r', encoding='utf-8') as f:
             except Exception as e:
                 print(e)
 
-            
\ No newline at end of file
+session.close()
@@ -1,13 +1,98 @@
 import os
-import openai
-import threading
 import time
-import queue as q
+import asyncio
+import contextvars
+from collections import OrderedDict
+import aiohttp
+import msgspec
+import openai
+import numpy as np
+import redis.asyncio as aioredis
 from dotenv import load_dotenv
 
 load_dotenv()
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
+# 카카오 스킬 응답 제한(5초) 안에 돌려줘야 하므로 그 전에 timeover 응답으로 끊는다.
+AI_RESPONSE_TIMEOUT_SECONDS = 3.5
+# 타임아웃 뒤에도 계속 도는 응답 생성 태스크가 gc되지 않도록 잡아 둔다.
+_background_tasks = set()
+
+# 사용자별로 마지막 답변을 '답변 조회'까지 보관한다.
+# ttl이 모두 같으므로 넣은 순서가 곧 만료 순서라, 오래된 것부터 앞쪽에서만 지우면 된다.
+AI_RESPONSE_CACHE_TTL_SECONDS = 600
+# 만료 확인은 조회할 때 해당 항목만 하고, 전체 정리는 가끔 백그라운드에서 한다.
+AI_RESPONSE_CACHE_SWEEP_SECONDS = 300
+user_responses_cache = OrderedDict()
+_sweeper = None
+# uvicorn worker가 여러 개면 worker마다 dict가 따로 생겨 '답변 조회'가 다른 worker로 가면 답변을 못 찾는다.
+# REDIS_URL이 있으면 모든 worker가 redis를 같이 쓰고, ttl도 redis가 처리한다. 없으면 위 dict를 쓴다.
+REDIS_URL = os.getenv('REDIS_URL')
+_redis = aioredis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+
+# 의미가 같은 질문은 gpt를 다시 부르지 않고 이전 답변을 돌려준다.
+EMBEDDING_MODEL = 'text-embedding-3-small'
+EMBEDDING_DIM = 1536
+SEMANTIC_CACHE_SIZE = 2000
+# 비슷하기만 한 질문에 다른 사용자의 답변이 나가지 않도록 거의 같은 질문일 때만 재사용한다.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.97'))
+# 식단, 일정처럼 바뀌는 답변이 오래 남지 않도록 한다.
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', '3600'))
+# 캐시 조회가 카카오 응답 시간을 잡아먹지 않도록 임베딩은 이 시간까지만 기다린다.
+SEMANTIC_CACHE_LOOKUP_SECONDS = 0.5
+
+
+class SemanticCache:
+    # 정규화한 임베딩을 행렬 하나에 모아 두고, 코사인 유사도를 행렬곱 한번으로 구한다.
+    # 가득 차면 가장 오래된 행부터 덮어쓴다.
+    def __init__(self, size=SEMANTIC_CACHE_SIZE, dim=EMBEDDING_DIM, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 ttl=SEMANTIC_CACHE_TTL_SECONDS):
+        self.embeddings = np.zeros((size, dim), dtype=np.float32)
+        self.timestamps = np.zeros(size, dtype=np.float64)
+        self.ttl = ttl
+        self.prompts = [None] * size
+        self.responses = [None] * size
+        self.threshold = threshold
+        self.count = 0
+        self.next_index = 0
+
+    @staticmethod
+    def normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def get(self, vector):
+        if self.count == 0:
+            return None
+        sims = self.embeddings[:self.count] @ vector
+        sims[time.monotonic() - self.timestamps[:self.count] > self.ttl] = -1.0
+        best = int(sims.argmax())
+        if sims[best] >= self.threshold:
+            print('Semantic cache hit : ', self.prompts[best])
+            return self.responses[best]
+        return None
+
+    def add(self, vector, prompt, response):
+        index = self.next_index
+        self.embeddings[index] = vector
+        self.timestamps[index] = time.monotonic()
+        self.prompts[index] = prompt
+        self.responses[index] = response
+        self.next_index = (index + 1) % len(self.prompts)
+        self.count = min(self.count + 1, len(self.prompts))
+
+
+semantic_cache = SemanticCache()
+
+def _lookup_quick_replies():
+    return [
+        {
+            "action": "message",
+            "label": "생성된 답변 조회",
+            "messageText": "답변 조회"
+        }
+    ]
+
 def text_response_format(bot_response):
     response = {
         "version":"2.0",
@@ -56,96 +141,244 @@ def timeover():
                     }
                 }
             ],
-            "quickReplies": [
+            "quickReplies": _lookup_quick_replies()
+        }
+    }
+    return response
+
+def partial_response_format(partial_text):
+    # 시간 안에 받은 부분까지 보여주고, 나머지는 '답변 조회'로 받도록 안내한다.
+    response = {
+        "version":"2.0",
+        "template": {
+            "outputs": [
                 {
-                    "action": "message",
-                    "label": "생성된 답변 조회",
-                    "messageText": "답변 조회"
+                    "simpleText": {
+                        "text": partial_text + "…"
+                    }
                 }
-            ]
+            ],
+            "quickReplies": _lookup_quick_replies()
         }
     }
     return response
 
-def get_text_from_gpt(prompt):
+_SYSTEM_PROMPT = "You are a thoughtful assitant. Respond to all input in 50words and answer in korean"
+
+# 요청마다 스트리밍으로 받은 토큰을 모아 두는 버퍼. 타임아웃이 나면 여기까지를 먼저 보여준다.
+_partial_answer = contextvars.ContextVar('partial_answer', default=None)
+
+async def get_text_from_gpt(prompt, buffers=()):
     messages_prompt = [
-        {"role": "system", "content": "You are a thoughtful assitant. Respond to all input in 50words and answer in korean"},
+        {"role": "system", "content": _SYSTEM_PROMPT},
     ]
     messages_prompt += [ {"role": "user", "content": prompt}, ]
-    response = openai.ChatCompletion.create(messages=messages_prompt, model="gpt-3.5-turbo")
-    message = response['choices'][0]['message']['content']
-    return message
+    # 다 만들어질 때까지 기다리지 않고 받는 대로 버퍼에 쌓는다.
+    response = await openai.ChatCompletion.acreate(messages=messages_prompt, model="gpt-3.5-turbo", stream=True)
+    tokens = []
+    async for chunk in response:
+        token = chunk['choices'][0]['delta'].get('content')
+        if token:
+            tokens.append(token)
+            for buffer in buffers:
+                buffer.append(token)
+    return ''.join(tokens)
+
+
+class InflightPrompts:
+    # 똑같은 질문이 동시에 들어오면 호출 하나를 같이 기다린다.
+    # 다른 사용자의 질문은 섞지 않고 각자 따로 스트리밍으로 묻는다.
+    def __init__(self):
+        self.inflight = {}
 
+    async def submit(self, prompt, buffer=None):
+        entry = self.inflight.get(prompt)
+        if entry is None:
+            # 첫 버퍼는 지금까지 받은 토큰 전체로, 나중에 같은 질문을 한 사용자에게 채워 준다.
+            buffers = [[]]
+            task = asyncio.create_task(get_text_from_gpt(prompt, buffers))
+            entry = self.inflight[prompt] = (task, buffers)
+            task.add_done_callback(lambda _: self.inflight.pop(prompt, None))
+        task, buffers = entry
+        if buffer is not None:
+            buffer.extend(buffers[0])
+            buffers.append(buffer)
+        # 한 사용자의 요청이 취소되어도 같이 기다리는 다른 사용자의 호출은 계속 진행한다.
+        return await asyncio.shield(task)
 
-def get_image_url_from_dalle(prompt):
-    response = openai.Image.create(prompt=prompt, n=1, size="1024x1024")
+
+inflight_prompts = InflightPrompts()
+
+
+async def get_embedding(prompt):
+    response = await openai.Embedding.acreate(model=EMBEDDING_MODEL, input=prompt)
+    return SemanticCache.normalize(response['data'][0]['embedding'])
+
+
+async def get_text_with_cache(prompt):
+    embedding = asyncio.create_task(get_embedding(prompt))
+    vector = None
+    try:
+        vector = await asyncio.wait_for(asyncio.shield(embedding), timeout=SEMANTIC_CACHE_LOOKUP_SECONDS)
+    except asyncio.TimeoutError:
+        print('Embedding is slow, skipping cache lookup')
+    except Exception as e:
+        # 임베딩을 못 구해도 답변은 해야 하므로 캐시 없이 진행한다.
+        print('Embedding failed : ', e)
+
+    if vector is not None:
+        bot_res = semantic_cache.get(vector)
+        if bot_res is not None:
+            return bot_res
+
+    bot_res = await inflight_prompts.submit(prompt, _partial_answer.get())
+    # 조회에 늦은 임베딩도 답변과 같이 저장해서 다음 질문에 쓴다.
+    try:
+        vector = await embedding
+    except Exception:
+        return bot_res
+    semantic_cache.add(vector, prompt, bot_res)
+    return bot_res
+
+
+async def get_image_url_from_dalle(prompt):
+    response = await openai.Image.acreate(prompt=prompt, n=1, size="1024x1024")
     image_url = response['data'][0]['url']
     return image_url
 
 
-def db_reset(filename):
-    with open(filename, 'w') as f:
-        f.write('')
-    
-def ai_chat(kakaorequest):
-    
-    run_flag = False
-    start_time = time.time()
-    
-    cwd = os.getcwd()
-    filename  = os.path.join(cwd,  'botlog.txt')
-    if not os.path.exists(filename):
-        with open(filename, 'w') as f:
-            f.write('')
-    else:
-        print("File exists")
-    
-    response_queue = q.Queue()
-    request_respond = threading.Thread(target=response_openai, args=(kakaorequest, response_queue, filename))
-    request_respond.start()
-    
-    while (time.time() - start_time < 3.5):
-        if not response_queue.empty():
-            response = response_queue.get()
-            run_flag = True
-            break
-        else:
-            time.sleep(0.1)
-    
-    if run_flag == False:
-        response = timeover()
-    
-    return response
+def _purge_expired(now):
+    while user_responses_cache:
+        oldest = next(iter(user_responses_cache.values()))
+        if now - oldest['timestamp'] <= AI_RESPONSE_CACHE_TTL_SECONDS:
+            return
+        user_responses_cache.popitem(last=False)
+
+
+async def _sweep_expired():
+    while True:
+        await asyncio.sleep(AI_RESPONSE_CACHE_SWEEP_SECONDS)
+        _purge_expired(time.monotonic())
+
+
+def _ensure_sweeper():
+    global _sweeper
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.create_task(_sweep_expired())
+
+
+def _redis_key(user_id):
+    return f'airesp:{user_id}'
+
+
+async def _save_response(user_id, kind, bot_res, prompt):
+    entry = {'type': kind, 'data': bot_res, 'prompt': prompt}
+    if _redis is not None:
+        await _redis.setex(_redis_key(user_id), AI_RESPONSE_CACHE_TTL_SECONDS, msgspec.json.encode(entry))
+        return
+    entry['timestamp'] = time.monotonic()
+    user_responses_cache[user_id] = entry
+    user_responses_cache.move_to_end(user_id)
+
+
+async def _pop_response(user_id):
+    if _redis is not None:
+        # 꺼내면서 지워야 같은 답변을 두 worker가 동시에 돌려주지 않는다.
+        raw = await _redis.getdel(_redis_key(user_id))
+        return msgspec.json.decode(raw) if raw else None
+    entry = user_responses_cache.pop(user_id, None)
+    if entry is None or time.monotonic() - entry['timestamp'] > AI_RESPONSE_CACHE_TTL_SECONDS:
+        return None
+    return entry
+
+
+# openai 0.28의 비동기 호출은 세션을 지정하지 않으면 요청마다 aiohttp 세션을 새로 만들어 tls 연결을 다시 맺는다.
+# 프로세스에서 세션 하나를 만들어 keep-alive 커넥션을 재사용한다.
+_aiosession = None
+
+def _get_aiosession():
+    global _aiosession
+    if _aiosession is None or _aiosession.closed:
+        _aiosession = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=200, limit_per_host=100, keepalive_timeout=60))
+    return _aiosession
+
+async def close_client():
+    if _sweeper is not None:
+        _sweeper.cancel()
+    if _redis is not None:
+        await _redis.close()
+    if _aiosession is not None and not _aiosession.closed:
+        await _aiosession.close()
+
+def _finish_task(task):
+    _background_tasks.discard(task)
+    # 타임아웃 뒤에 실패한 경우도 여기서 예외를 읽어 로그만 남긴다.
+    if not task.cancelled() and task.exception() is not None:
+        print('AI response failed : ', repr(task.exception()))
+
+async def ai_chat(kakaorequest):
+    # 아래에서 만드는 태스크들은 지금 컨텍스트를 복사하므로, 공유 세션을 여기서 지정하면 모든 openai 호출이 같이 쓴다.
+    openai.aiosession.set(_get_aiosession())
+    if _redis is None:
+        _ensure_sweeper()
+    partial_answer = []
+    _partial_answer.set(partial_answer)
+    # 스레드와 큐를 폴링하지 않고 이벤트 루프에서 바로 기다린다.
+    # shield로 감싸서 시간이 넘어도 응답 생성은 끝까지 진행되어 캐시에 남고, '답변 조회'로 받아갈 수 있다.
+    task = asyncio.create_task(response_openai(kakaorequest))
+    _background_tasks.add(task)
+    task.add_done_callback(_finish_task)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout=AI_RESPONSE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # 생성은 계속 진행되어 전체 답변이 캐시에 남는다.
+        if partial_answer:
+            return partial_response_format(''.join(partial_answer))
+        return timeover()
+    except Exception:
+        # openai 오류 등으로 실패해도 카카오에는 항상 스킬 응답 형식으로 돌려준다.
+        return text_response_format('답변을 만들지 못했습니다. 잠시 후 다시 시도해주세요.')
+
+async def _handle_lookup(arg, user_id):
+    entry = await _pop_response(user_id)
+    if entry is not None:
+        if entry['type'] == 'img':
+            return image_response_format(entry['data'], entry['prompt'])
+        return text_response_format(entry['data'])
+    # 아직 생성중이면 3.5초를 기다리지 않고 바로 다시 조회하도록 안내한다.
+    return timeover()
+
+async def _handle_img(prompt, user_id):
+    await _pop_response(user_id)
+    bot_res = await get_image_url_from_dalle(prompt)
+    await _save_response(user_id, 'img', bot_res, prompt)
+    return image_response_format(bot_res, prompt)
+
+async def _handle_ask(prompt, user_id):
+    await _pop_response(user_id)
+    bot_res = await get_text_with_cache(prompt)
+    await _save_response(user_id, 'ask', bot_res, prompt)
+    return text_response_format(bot_res)
+
+async def _handle_unknown(arg, user_id):
+    return {'version':'2.0', 'template': {'outputs':[], 'quickReplies':[]}}
+
+# 발화 전체가 일치하는 명령을 먼저 찾고, 없으면 첫 단어로 처리 함수를 찾는다.
+_UTTERANCE_HANDLERS = {
+    '답변 조회': _handle_lookup,
+}
+_COMMAND_HANDLERS = {
+    '/img': _handle_img,
+    '/ask': _handle_ask,
+}
 
-def response_openai(request, response_queue, filename):
-    if '답변 조회' in request['userRequest']['utterance']:
-        with open(filename) as f:
-            last_update = f.read()
-        if len(last_update.split()) > 1:
-            kind, bot_res, prompt = last_update.split('|')[0], last_update.split('|')[1], last_update.split('|')[2]
-            if kind == 'img':
-                response_queue.put(image_response_format(bot_res, prompt))
-            else:
-                response_queue.put(text_response_format(bot_res))
-            db_reset(filename)
-    elif '/img' in request['userRequest']['utterance']:
-        db_reset(filename)
-        prompt = request['userRequest']['utterance'].replace('/img', '')
-        bot_res = get_image_url_from_dalle(prompt)
-        response_queue.put(image_response_format(bot_res, prompt))
-        save_log = "img" + "|" + str(bot_res) + "|" + str(prompt)
-        with open(filename, 'w') as f:
-            f.write(save_log)
-        pass
-    elif '/ask' in request['userRequest']['utterance']:
-        db_reset(filename)
-        prompt = request['userRequest']['utterance'].replace('/ask', '')
-        bot_res = get_text_from_gpt(prompt)
-        response_queue.put(text_response_format(bot_res))
-        
-        save_log = "ask" + "|" + str(bot_res) + "|" + str(prompt)
-        with open(filename, 'w') as f:
-            f.write(save_log)
-    else:
-        base_response = {'version':'2.0', 'template': {'outputs':[], 'quickReplies':[]}}
-        response_queue.put(base_response)
+async def response_openai(request):
+    user_id = request.userRequest.user.id
+    utterance = request.userRequest.utterance.strip()
+    handler = _UTTERANCE_HANDLERS.get(utterance)
+    if handler is not None:
+        return await handler('', user_id)
+    cmd, _, arg = utterance.partition(' ')
+    handler = _COMMAND_HANDLERS.get(cmd, _handle_unknown)
+    return await handler(arg.strip(), user_id)
@@ -1,18 +1,28 @@
 import os
 import openai
-from domain.ai import ai_crud
+import msgspec
+from domain.ai import ai_crud, ai_schema
 
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, HTTPException, Response
 
 router = APIRouter(
     prefix="/ai",
 )
 
+@router.on_event('shutdown')
+async def close_ai_client():
+    await ai_crud.close_client()
+
 @router.post('/skill')
 async def ai_skill(request: Request):
-    kakaorequest = await request.json()
-    return ai_crud.ai_chat(kakaorequest)
+    # 본문을 dict로 풀었다가 다시 검증하지 않고, msgspec으로 파싱과 검증을 한번에 한다.
+    try:
+        kakaorequest = ai_schema.kakao_chat_request_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    response = await ai_crud.ai_chat(kakaorequest)
+    return Response(content=msgspec.json.encode(response), media_type='application/json')
 
 @router.post('/update')
 def regulation_update():
@@ -1,4 +1,20 @@
+import msgspec
 from pydantic import BaseModel
 
 class RegulationSkill(BaseModel):
-    pass
\ No newline at end of file
+    pass
+
+
+# ai 스킬은 요청마다 들어오므로 필요한 필드만 msgspec으로 한번에 파싱, 검증한다.
+# 정의하지 않은 필드는 무시한다.
+class KakaoUser(msgspec.Struct):
+    id: str
+
+class KakaoUserRequest(msgspec.Struct):
+    utterance: str
+    user: KakaoUser
+
+class KakaoChatRequestSchema(msgspec.Struct):
+    userRequest: KakaoUserRequest
+
+kakao_chat_request_decoder = msgspec.json.Decoder(KakaoChatRequestSchema)
@@ -1,15 +1,32 @@
-from typing import List
+from typing import Dict, List
 import datetime
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from models import Cafeteria
 
+# 식당 위치는 몇 개 안되고 거의 바뀌지 않으므로 처음 한번 모두 읽어 두고 재사용한다.
+_location_to_id: Dict[str, int] = {}
+
+def clear_cafeteria_id_cache() -> None:
+    # 식당이 추가되거나 바뀌면 호출한다.
+    _location_to_id.clear()
+
 def get_cafeteria_id(db: Session, location: str) -> int:
-    cafeteria = db.query(Cafeteria).filter_by(location = location).one()
-    return cafeteria.id
-
-def get_operation_times(db:Session, cafeteria_id: int) -> List[datetime.datetime]:
-    cafeteria : Cafeteria = db.query(Cafeteria).get(cafeteria_id).one()
-    return [cafeteria.breakfast_start_time, cafeteria.breakfast_end_time,
-            cafeteria.lunch_start_time, cafeteria.lunch_end_time,
-            cafeteria.dinner_start_time, cafeteria.dinner_end_time]
\ No newline at end of file
+    if not _location_to_id:
+        _location_to_id.update((loc, id) for id, loc in db.query(Cafeteria.id, Cafeteria.location))
+    cafeteria_id = _location_to_id.get(location)
+    if cafeteria_id is None:
+        # 캐시에 없으면 기존처럼 직접 찾는다. 없는 위치면 NoResultFound가 그대로 올라간다.
+        cafeteria_id = db.query(Cafeteria.id).filter_by(location = location).one().id
+        _location_to_id[location] = cafeteria_id
+    return cafeteria_id
+
+def get_operation_times(db:Session, cafeteria_id: int) -> List[datetime.time] | None:
+    # orm 객체 전체를 만들지 않고 필요한 운영시간 6개 컬럼만 읽는다.
+    row = db.execute(
+        select(Cafeteria.breakfast_start_time, Cafeteria.breakfast_end_time,
+               Cafeteria.lunch_start_time, Cafeteria.lunch_end_time,
+               Cafeteria.dinner_start_time, Cafeteria.dinner_end_time)
+        .where(Cafeteria.id == cafeteria_id)).one_or_none()
+    return list(row) if row else None
@@ -46,14 +46,13 @@ class DietUpload(BaseModel):
         self.set_img_url_path()
     
     def set_cafeteria_id(self):
-        for idx, elem in enumerate(self.candidates):
-            if elem in self.post_title:
-                if elem == '안평':
-                    idx -= 1
-                # db의 외래키는 1부터 시작하므로 +1 해줘야 한다.
-                self.cafeteria_id = idx + 1
-                return
-        raise ValueError('Invalid cafeteria name')
+        idx = find_cafeteria_index(self.post_title)
+        if idx is None:
+            raise ValueError('Invalid cafeteria name')
+        if self.candidates[idx] == '안평':
+            idx -= 1
+        # db의 외래키는 1부터 시작하므로 +1 해줘야 한다.
+        self.cafeteria_id = idx + 1
 
     def set_img_url_path(self):
         if not self.cafeteria_id:
@@ -82,9 +81,8 @@ class DietUtterance(BaseModel):
         self.set_location()  # Call set_location before the super().__init__
     
     def set_location(self):
-        for full_name, semi_name in zip(cafeteria_full_name_list, cafeteria_semi_name_list):
-            if full_name in self.utterance or semi_name in self.utterance:
-                full_name = '경전철' if full_name == '안평' else full_name
-                self.location = full_name
-                return
-        raise ValueError("Invalid Location")
+        idx = find_cafeteria_index(self.utterance, include_semi_names=True)
+        if idx is None:
+            raise ValueError("Invalid Location")
+        full_name = cafeteria_full_name_list[idx]
+        self.location = '경전철' if full_name == '안평' else full_name
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Time, func, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Time, func, Enum, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -46,6 +46,12 @@ class Cafeteria(Base):
     
 class Regulation(Base):
     __tablename__ = "regulations"
+    # title은 unique라 이미 인덱스가 있으므로, 변환 대상(html_url이 없는 행) 조회용 부분 인덱스만 둔다.
+    __table_args__ = (
+        Index('ix_regulations_html_url_null', 'html_url',
+              sqlite_where=text('html_url IS NULL'),
+              postgresql_where=text('html_url IS NULL')),
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(String(length=100), nullable=False, unique=True)
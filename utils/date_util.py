@@ -4,6 +4,4 @@ def get_next_monday(dt: datetime.datetime) -> datetime.datetime:
     return get_last_monday(dt) + datetime.timedelta(days=7)
 
 def get_last_monday(dt: datetime.datetime) -> datetime.datetime:
-    while dt.weekday() != 0:
-        dt -= datetime.timedelta(days=1)
-    return dt
\ No newline at end of file
+    return dt - datetime.timedelta(days=dt.weekday())
\ No newline at end of file
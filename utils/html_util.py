@@ -0,0 +1,3 @@
+def class_xpath(tag: str, class_name: str) -> str:
+    # css의 tag.class 선택자와 같은 XPath. class 속성에 여러 값이 있어도 단어 단위로 비교한다.
+    return f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
@@ -0,0 +1,23 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+def create_session(pool_maxsize: int = 16, retries: int = 3, backoff_factor: float = 0.5,
+                   cache_dir: str | None = None) -> requests.Session:
+    # 크롤러의 요청은 대부분 같은 호스트로 가므로, 세션 하나를 만들어 keep-alive 커넥션을 재사용한다.
+    # 동시에 요청하는 스레드 수만큼 pool_maxsize를 잡는다.
+    adapter_kwargs = dict(pool_connections=pool_maxsize,
+                          pool_maxsize=pool_maxsize,
+                          max_retries=Retry(total=retries, backoff_factor=backoff_factor,
+                                            status_forcelist=(502, 503, 504)))
+    if cache_dir:
+        # ETag/Last-Modified로 재검증해서 바뀌지 않은 응답은 디스크 캐시에서 읽는다.
+        from cachecontrol import CacheControlAdapter
+        from cachecontrol.caches.file_cache import FileCache
+        adapter = CacheControlAdapter(cache=FileCache(cache_dir), **adapter_kwargs)
+    else:
+        adapter = HTTPAdapter(**adapter_kwargs)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session